@@ -86,6 +86,11 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 
+# PIL resample filter for upload thumbnails (a PIL.Image.Resampling name).
+# BILINEAR is ~2-3x faster than LANCZOS and looks the same at 200x200;
+# use 'HAMMING' or 'LANCZOS' for sharper thumbnails.
+SAMPLES_THUMB_RESAMPLE = 'BILINEAR'
+
 # Logging configuration
 
 LOGGING = {
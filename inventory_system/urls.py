@@ -14,6 +14,8 @@ urlpatterns = [
     path('delete_samples/', views.delete_samples, name='delete_samples'),
     path('handle_print_request/', views.handle_print_request, name='handle_print_request'),
     path('manage_sample/<int:sample_id>/', views.manage_sample, name='manage_sample'),
+    path('start_documentation_export/<int:sample_id>/', views.start_documentation_export, name='start_documentation_export'),
+    path('download_documentation_export/<str:task_id>/', views.download_documentation_export, name='download_documentation_export'),
     path('upload_files/', views.upload_files, name='upload_files'),
     path('get_sample_images/', views.get_sample_images, name='get_sample_images'),
     path('delete_sample_image/', views.delete_sample_image, name='delete_sample_image'),
@@ -0,0 +1,18 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from samples.utils import EXCEL_CACHE_FILE, export_excel_cache
+
+
+class Command(BaseCommand):
+    help = "Re-export Apps_Database.xlsx to the JSON sidecar used by the create_sample page"
+
+    def handle(self, *args, **options):
+        excel_file = os.path.join(settings.BASE_DIR, 'Apps_Database.xlsx')
+        if not os.path.exists(excel_file):
+            raise CommandError(f"Excel file not found at {excel_file}")
+
+        payload = export_excel_cache(excel_file)
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {len(payload['rows'])} rows to {EXCEL_CACHE_FILE}"
+        ))
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.7 on 2026-10-16 17:00
+
+import samples.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('samples', '0007_alter_sampleimage_full_size_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Opportunity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('opportunity_number', models.CharField(max_length=255, unique=True)),
+                ('new', models.BooleanField(default=False)),
+                ('sample_ids', models.TextField(blank=True)),
+                ('update', models.BooleanField(default=True)),
+                ('customer', models.CharField(blank=True, max_length=255, null=True)),
+                ('rsm', models.CharField(blank=True, max_length=255, null=True)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('date_received', models.DateField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='sampleimage',
+            name='full_size_image',
+            field=models.ImageField(blank=True, null=True, storage=samples.models.FullSizeImageStorage(), upload_to=samples.models.get_full_size_image_upload_path),
+        ),
+        migrations.AddIndex(
+            model_name='sample',
+            index=models.Index(fields=['opportunity_number', 'unique_id', 'date_received'], name='sample_opp_uid_date_idx'),
+        ),
+    ]
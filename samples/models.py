@@ -112,6 +112,17 @@ class Sample(models.Model):
     description = models.TextField(default="No description")
     audit = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # get_documentation() reads an opportunity's (unique_id, date_received)
+            # rows with filter(opportunity_number=...).order_by('unique_id'); this
+            # index answers the filter and the ordering and covers both columns
+            models.Index(
+                fields=['opportunity_number', 'unique_id', 'date_received'],
+                name='sample_opp_uid_date_idx',
+            ),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.unique_id:
             for _ in range(100):
@@ -150,34 +161,47 @@ class Sample(models.Model):
     def delete(self, *args, **kwargs):
         opportunity_number = self.opportunity_number
         super().delete(*args, **kwargs)
+        sync_opportunity_after_delete(opportunity_number)
 
-        try:
-            opportunity = Opportunity.objects.get(opportunity_number=opportunity_number)
-
-            # Retrieve all unique IDs associated with this opportunity after deletion
-            sample_ids = Sample.objects.filter(
-                opportunity_number=opportunity_number
-            ).values_list('unique_id', flat=True)
-
-            if sample_ids:
-                # Update the sample_ids field
-                opportunity.sample_ids = ','.join(map(str, sample_ids))
-                opportunity.update = True  # Set the 'update' field to True
-                opportunity.save()
-            else:
-                # Set 'update' to True before deleting the Opportunity
-                opportunity.update = True
-                opportunity.save()
-
-                # If no samples remain, delete the Opportunity entry
-                opportunity.delete()
-                opportunity = None
-
-                # Add these lines to delete files and folders
-                delete_documentation_from_sharepoint(opportunity_number)
-                delete_local_opportunity_folder(opportunity_number)
-        except Opportunity.DoesNotExist:
-            opportunity = None  # Opportunity might have been deleted already
+def sync_opportunity_after_delete(opportunity_number):
+    # Refresh the Opportunity after its samples were deleted, removing it (and its
+    # SharePoint/local folders) once no samples remain
+    try:
+        opportunity = Opportunity.objects.get(opportunity_number=opportunity_number)
+
+        # Retrieve all unique IDs associated with this opportunity after deletion
+        sample_ids = Sample.objects.filter(
+            opportunity_number=opportunity_number
+        ).values_list('unique_id', flat=True)
+
+        if sample_ids:
+            # Update the sample_ids field
+            opportunity.sample_ids = ','.join(map(str, sample_ids))
+            opportunity.update = True  # Set the 'update' field to True
+            opportunity.save()
+        else:
+            # Set 'update' to True before deleting the Opportunity
+            opportunity.update = True
+            opportunity.save()
+
+            # If no samples remain, delete the Opportunity entry
+            opportunity.delete()
+            opportunity = None
+
+            # Add these lines to delete files and folders
+            delete_documentation_from_sharepoint(opportunity_number)
+            delete_local_opportunity_folder(opportunity_number)
+    except Opportunity.DoesNotExist:
+        opportunity = None  # Opportunity might have been deleted already
+
+def generate_unique_ids(count):
+    # Allocate IDs for bulk_create, which bypasses Sample.save(); one query for
+    # the taken IDs instead of an exists() check per candidate
+    taken = set(Sample.objects.values_list('unique_id', flat=True))
+    available = [unique_id for unique_id in range(1000, 10000) if unique_id not in taken]
+    if len(available) < count:
+        raise ValueError(f"Could not generate {count} unique IDs; only {len(available)} remain.")
+    return random.sample(available, count)
 
 def get_image_upload_path(instance, filename):
     opportunity_number = str(instance.sample.opportunity_number)
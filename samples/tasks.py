@@ -1,11 +1,15 @@
 from celery import shared_task
+from django.conf import settings
+from django.core.files import File
 from django.core.files.base import ContentFile
+from io import BytesIO
+from PIL import Image
 import os
 from .models import SampleImage, get_image_upload_path, Sample, Opportunity
 from .email_utils import send_email, get_rsm_email, NICKNAMES, TEST_LAB_GROUP
 import logging
 from .CreateOppFolderSharepoint import create_sharepoint_folder
-from .utils import create_documentation_on_sharepoint
+from .utils import create_documentation_on_sharepoint, get_documentation
 from .EditExcelSharepoint import (
     get_access_token,
     find_excel_file,
@@ -44,6 +48,24 @@ def create_documentation_on_sharepoint_task(opportunity_number):
     except Exception as e:
         logger.error(f"Error copying documentation template to SharePoint for opportunity {opportunity_number}: {e}")
 @shared_task
+def generate_documentation_task(sample_id):
+    # Build (or find in the cache) the documentation workbook for a sample's opportunity;
+    # the cache file name is returned so the web process can serve it
+    try:
+        # Only the fields get_documentation() can fall back on are loaded
+        sample = Sample.objects.only(
+            'customer', 'rsm', 'opportunity_number', 'description'
+        ).get(unique_id=sample_id)
+        cache_path = get_documentation(sample)
+    except Exception as e:
+        logger.error(f"Error generating documentation for sample {sample_id}: {e}")
+        raise
+    return {
+        'cache_file': os.path.basename(cache_path),
+        'filename': f"Documentation_{sample.opportunity_number}.xlsm",
+    }
+
+@shared_task
 def update_documentation_excels():
     logger.info("Starting update_documentation_excels task.")
     try:
@@ -190,6 +212,52 @@ def update_documentation_excels():
     except Exception as e:
         logger.error(f"An error occurred in update_documentation_excels task: {e}")
 
+@shared_task
+def make_thumbnail(sample_image_id, temp_file_path, filename):
+    try:
+        # Retrieve the SampleImage instance
+        sample_image = SampleImage.objects.get(id=sample_image_id)
+
+        max_size = (200, 200)  # Set the desired thumbnail size
+        with Image.open(temp_file_path) as image:
+            # Let libjpeg decode at a reduced DCT scale (no-op for non-JPEGs);
+            # asking for twice the thumbnail size leaves room for the resample filter
+            image.draft('RGB', (max_size[0] * 2, max_size[1] * 2))
+            # Palette/bilevel images can only be resized with NEAREST, so those (and
+            # exotic modes) are converted up front; everything else is converted
+            # after downscaling, on the thumbnail instead of the full-size pixels
+            if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                image = image.convert('RGB')
+
+            # Create a thumbnail; the filter name comes from SAMPLES_THUMB_RESAMPLE
+            resample = Image.Resampling[getattr(settings, 'SAMPLES_THUMB_RESAMPLE', 'BILINEAR')]
+            image.thumbnail(max_size, resample=resample)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')  # Ensure image is in RGB mode for JPEG
+
+            # Save the thumbnail to an in-memory file
+            thumb_io = BytesIO()
+            image.save(thumb_io, format='JPEG', quality=85)
+
+        # Save the thumbnail image to the model
+        sample_image.image.save(filename, ContentFile(thumb_io.getvalue()))
+
+        logger.info(f"Thumbnail saved for SampleImage ID {sample_image_id}")
+
+    except SampleImage.DoesNotExist:
+        logger.error(f"SampleImage with ID {sample_image_id} does not exist.")
+        raise
+    except Exception as e:
+        logger.error(f"Error creating thumbnail for SampleImage ID {sample_image_id}: {e}")
+        # The upload has no usable image, so drop its record (otherwise it lingers
+        # with an empty thumbnail that the UI can neither show nor delete) and the
+        # temporary file save_full_size_image would have cleaned up
+        SampleImage.objects.filter(id=sample_image_id).delete()
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        # Re-raise so the chain stops before save_full_size_image
+        raise
+
 @shared_task
 def save_full_size_image(sample_image_id, temp_file_path):
     try:
@@ -203,16 +271,10 @@ def save_full_size_image(sample_image_id, temp_file_path):
         # Use the same filename for the full-size image
         filename = thumbnail_filename
 
-        # Read the binary data from the temporary file
+        # Stream the temporary file into storage in chunks rather than reading it
+        # into memory; save() also saves the model
         with open(temp_file_path, 'rb') as f:
-            file_data = f.read()
-
-        # Create a ContentFile from the binary data
-        full_size_image_content = ContentFile(file_data)
-
-        # Save the full-size image using just the filename
-        sample_image.full_size_image.save(filename, full_size_image_content)
-        sample_image.save()
+            sample_image.full_size_image.save(filename, File(f))
 
         logger.info(f"Full-size image saved for SampleImage ID {sample_image_id}")
 
@@ -1,3 +1,170 @@
-from django.test import TestCase
+import contextlib
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from openpyxl import Workbook, load_workbook
+
+from . import utils
+from .models import Opportunity, Sample
+from .views import MAX_ID_BATCH, parse_id_list
+
+
+class ParseIdListTests(SimpleTestCase):
+    def test_accepts_ints_and_digit_strings(self):
+        self.assertEqual(parse_id_list('[1234, "5678"]'), (1234, 5678))
+
+    def test_empty_list(self):
+        self.assertEqual(parse_id_list('[]'), ())
+
+    def test_rejects_non_array(self):
+        for raw in ('{"ids": [1]}', '1234', '"1234"', 'null'):
+            with self.subTest(raw=raw):
+                with self.assertRaises(ValueError):
+                    parse_id_list(raw)
+
+    def test_rejects_invalid_json(self):
+        with self.assertRaises(ValueError):
+            parse_id_list('[1, 2')
+
+    def test_rejects_invalid_elements(self):
+        for raw in ('[null]', '[[1]]', '[{"id": 1}]', '[12.9]', '[1.5]', '[true]', '[false]',
+                    '["12a"]', '["-1"]', '[" 1"]', '[""]'):
+            with self.subTest(raw=raw):
+                with self.assertRaises(ValueError):
+                    parse_id_list(raw)
+
+    def test_batch_limit(self):
+        self.assertEqual(len(parse_id_list(json.dumps(list(range(MAX_ID_BATCH))))), MAX_ID_BATCH)
+        with self.assertRaises(ValueError):
+            parse_id_list(json.dumps(list(range(MAX_ID_BATCH + 1))))
+
+
+class DocumentationCacheDirMixin:
+    # Points the documentation cache at a throwaway directory for each test
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        patcher = mock.patch.object(utils, 'DOCUMENTATION_CACHE_DIR', self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_file(self, name, age=0):
+        # Create name in the cache directory with its mtime age seconds in the past
+        path = os.path.join(self.cache_dir, name)
+        with open(path, 'wb'):
+            pass
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def cached_names(self):
+        return sorted(os.listdir(self.cache_dir))
+
+
+class PruneDocumentationCacheTests(DocumentationCacheDirMixin, SimpleTestCase):
+    def test_keeps_most_recently_used(self):
+        for age in range(5):
+            self.make_file(f'{age}.xlsm', age=age * 10)
+        utils.prune_documentation_cache(max_files=2)
+        self.assertEqual(self.cached_names(), ['0.xlsm', '1.xlsm'])
+
+    def test_under_limit_keeps_everything(self):
+        self.make_file('a.xlsm')
+        self.make_file('b.xlsm')
+        utils.prune_documentation_cache(max_files=2)
+        self.assertEqual(self.cached_names(), ['a.xlsm', 'b.xlsm'])
+
+    def test_removes_stale_temp_files_only(self):
+        self.make_file('stale.tmp', age=utils.DOCUMENTATION_TMP_MAX_AGE + 60)
+        self.make_file('fresh.tmp')
+        self.make_file('a.xlsm')
+        utils.prune_documentation_cache(max_files=2)
+        self.assertEqual(self.cached_names(), ['a.xlsm', 'fresh.tmp'])
+
+    def test_ignores_files_that_vanish_mid_prune(self):
+        for age in range(4):
+            self.make_file(f'{age}.xlsm', age=age * 10)
+        renamed_tmp = self.make_file('renamed.tmp', age=utils.DOCUMENTATION_TMP_MAX_AGE + 60)
+        pruned_xlsm = os.path.join(self.cache_dir, '3.xlsm')
+        real_scandir = os.scandir
+
+        def scandir_then_vanish(path):
+            # Another worker renames a temp file into place and prunes a workbook
+            # after the directory was listed but before the entries are stat'ed
+            entries = list(real_scandir(path))
+            os.unlink(renamed_tmp)
+            os.unlink(pruned_xlsm)
+            return contextlib.nullcontext(entries)
+
+        with mock.patch.object(utils.os, 'scandir', scandir_then_vanish):
+            utils.prune_documentation_cache(max_files=2)
+        self.assertEqual(self.cached_names(), ['0.xlsm', '1.xlsm'])
+
+
+class GetDocumentationTests(DocumentationCacheDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        template_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, template_dir, ignore_errors=True)
+        self.template_file = os.path.join(template_dir, 'DocumentationTemplate.xlsm')
+        Workbook().save(self.template_file)
+
+        Opportunity.objects.create(
+            opportunity_number='5001', customer='Acme', rsm='Jane Doe', description='Frozen pies'
+        )
+        self.sample = Sample.objects.create(
+            unique_id=1002, date_received=datetime.date(2024, 11, 27), customer='Acme',
+            opportunity_number='5001', rsm='Jane Doe', description='Frozen pies'
+        )
+        Sample.objects.create(
+            unique_id=1001, date_received=datetime.date(2024, 11, 20), customer='Acme',
+            opportunity_number='5001', rsm='Jane Doe', description='Frozen pies'
+        )
+
+    def get_documentation(self):
+        with mock.patch.object(utils, 'load_workbook', wraps=load_workbook) as load:
+            path = utils.get_documentation(self.sample, template_file=self.template_file)
+        return path, load.call_count
+
+    def test_writes_opportunity_layout(self):
+        path, _ = self.get_documentation()
+        ws = load_workbook(path).active
+        self.assertEqual(
+            [ws.cell(row=row, column=2).value for row in range(1, 5)],
+            ['Acme', 'Jane Doe', '5001', 'Frozen pies']
+        )
+        self.assertEqual(
+            [(ws.cell(row=row, column=1).value, ws.cell(row=row, column=2).value) for row in (8, 9)],
+            [(1001, '2024-11-20'), (1002, '2024-11-27')]
+        )
+
+    def test_cache_hit_skips_rebuild(self):
+        first_path, first_loads = self.get_documentation()
+        second_path, second_loads = self.get_documentation()
+        self.assertEqual((first_loads, second_loads), (1, 0))
+        self.assertEqual(first_path, second_path)
+
+    def test_rebuilds_after_entry_is_pruned(self):
+        path, _ = self.get_documentation()
+        os.unlink(path)
+        rebuilt_path, loads = self.get_documentation()
+        self.assertEqual(rebuilt_path, path)
+        self.assertEqual(loads, 1)
+        self.assertTrue(os.path.exists(path))
+
+    def test_new_sample_gets_new_entry(self):
+        path, _ = self.get_documentation()
+        Sample.objects.create(
+            unique_id=1003, date_received=datetime.date(2024, 11, 28), customer='Acme',
+            opportunity_number='5001', rsm='Jane Doe', description='Frozen pies'
+        )
+        new_path, loads = self.get_documentation()
+        self.assertNotEqual(new_path, path)
+        self.assertEqual(loads, 1)
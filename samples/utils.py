@@ -1,9 +1,31 @@
 import os
+import csv
+import json
+import functools
+import hashlib
+import tempfile
+import time
+from io import BytesIO
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import Sample, Opportunity
 import pandas as pd
+from openpyxl import load_workbook
 import subprocess
 import logging
 
+# Customer/RSM lookups exported from Apps_Database.xlsx so page loads don't parse the workbook
+EXCEL_CACHE_FILE = os.path.join(settings.BASE_DIR, 'Apps_Database.json')
+EXCEL_CACHE_COLUMNS = ['Customer', 'RSM', 'Opportunity #', 'Description']
+
+DOCUMENTATION_TEMPLATE_FILE = os.path.join(settings.BASE_DIR, 'OneDrive_Sync', '_Templates', 'DocumentationTemplate.xlsm')
+
+# Generated documentation workbooks, each named by a hash of everything written into it
+DOCUMENTATION_CACHE_DIR = os.path.join(settings.BASE_DIR, 'documentation_cache')
+DOCUMENTATION_CACHE_MAX_FILES = 200
+# Temp files older than this can only be left over from a crashed save
+DOCUMENTATION_TMP_MAX_AGE = 60 * 60
+
 def create_documentation_on_sharepoint(opportunity_number):
     logger = logging.getLogger(__name__)
 
@@ -56,3 +78,238 @@ def read_excel_data(file_path):
 def get_unique_values(data, key):
     return list({record[key] for record in data})
 
+
+def _file_signature(path):
+    # Identifies a version of a file for the caches below: (mtime_ns, size), compared
+    # for equality so a replacement that keeps an older mtime (cp -p, rsync, rclone)
+    # is still noticed
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def export_excel_cache(excel_file, cache_file=EXCEL_CACHE_FILE):
+    """
+    Parse the apps database workbook once and write the customer/RSM lookups
+    and row data to a JSON sidecar file. Returns the exported payload.
+    """
+    # Taken before reading so a workbook changed mid-export is re-exported next time
+    source = list(_file_signature(excel_file))
+
+    # Only the columns create_sample.html reads; text columns skip dtype inference
+    df = pd.read_excel(
+        excel_file,
+        usecols=EXCEL_CACHE_COLUMNS,
+        dtype={'Customer': str, 'RSM': str, 'Description': str},
+        engine='openpyxl'
+    )
+    payload = {
+        'source': source,
+        'customers': sorted(df['Customer'].dropna().unique().tolist()),
+        'rsms': sorted(df['RSM'].dropna().unique().tolist()),
+        'rows': df.to_dict(orient='records'),
+    }
+
+    # Write to a temp file beside the sidecar and rename it into place, so other
+    # workers never read a half-written file
+    tmp = tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', dir=os.path.dirname(cache_file), suffix='.tmp', delete=False
+    )
+    try:
+        with tmp:
+            json.dump(payload, tmp, cls=DjangoJSONEncoder)
+        os.replace(tmp.name, cache_file)
+    except BaseException:
+        try:
+            os.unlink(tmp.name)
+        except FileNotFoundError:
+            pass
+        raise
+    return payload
+
+def load_excel_cache(excel_file, cache_file=EXCEL_CACHE_FILE):
+    """
+    Return the exported lookups, re-exporting first if the sidecar is missing,
+    unreadable, or was exported from a different version of the workbook.
+    """
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            excel_cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        excel_cache = None
+    if excel_cache is not None and excel_cache.get('source') == list(_file_signature(excel_file)):
+        return excel_cache
+    return export_excel_cache(excel_file, cache_file)
+
+@functools.lru_cache(maxsize=4)
+def _load_excel_lookups(excel_file, signature):
+    # The workbook's signature is part of the cache key so a changed workbook is
+    # picked up automatically
+    excel_cache = load_excel_cache(excel_file)
+    return (
+        tuple(excel_cache['customers']),
+        tuple(excel_cache['rsms']),
+        json.dumps(excel_cache['rows'], cls=DjangoJSONEncoder),
+    )
+
+def get_excel_lookups(excel_file):
+    """
+    Return (customers, rsms, rows_json) for the workbook, reusing the parsed and
+    JSON-encoded data until the workbook's modification time or size changes.
+    """
+    return _load_excel_lookups(excel_file, _file_signature(excel_file))
+
+@functools.lru_cache(maxsize=2)
+def _load_hyperlinks(csv_file, signature):
+    with open(csv_file, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Skip header row if present
+        return {row[0].strip(): row[1].strip() for row in reader if len(row) >= 2}
+
+def get_opportunity_links(csv_file):
+    """
+    Return the opportunity number -> SharePoint link mapping from Hyperlinks.csv,
+    reparsing only when the file's modification time or size changes.
+    """
+    return _load_hyperlinks(csv_file, _file_signature(csv_file))
+
+@functools.lru_cache(maxsize=1)
+def _load_template_bytes(template_file, signature):
+    with open(template_file, 'rb') as f:
+        return f.read()
+
+def open_documentation_template(template_file):
+    """
+    Return a fresh in-memory copy of the documentation template. The bytes are
+    read from disk once and reused until the file's modification time or size changes;
+    every caller gets its own buffer, so nothing shared is ever mutated.
+    """
+    return BytesIO(_load_template_bytes(template_file, _file_signature(template_file)))
+
+def documentation_cache_path(*parts):
+    """
+    Return the cache path for a documentation workbook built from parts. The
+    name is a hash of the parts, so any change in content gets a new entry and
+    stale entries simply age out.
+    """
+    key = hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=16).hexdigest()
+    return os.path.join(DOCUMENTATION_CACHE_DIR, f'{key}.xlsm')
+
+def store_documentation(wb, cache_path):
+    """
+    Save wb to cache_path atomically: it is written to a temp file in the cache
+    directory and renamed into place, so readers never see a partial workbook.
+    """
+    os.makedirs(DOCUMENTATION_CACHE_DIR, exist_ok=True)
+    tmp = tempfile.NamedTemporaryFile(dir=DOCUMENTATION_CACHE_DIR, suffix='.tmp', delete=False)
+    try:
+        with tmp:
+            wb.save(tmp)
+        os.replace(tmp.name, cache_path)
+    except BaseException:
+        # Never leave a half-written temp file behind, whatever went wrong
+        try:
+            os.unlink(tmp.name)
+        except FileNotFoundError:
+            pass
+        raise
+
+def prune_documentation_cache(max_files=DOCUMENTATION_CACHE_MAX_FILES):
+    """
+    Delete all but the max_files most recently used cached workbooks, along
+    with any temp files orphaned by a worker that died mid-save.
+    """
+    entries = []
+    stale_before = time.time() - DOCUMENTATION_TMP_MAX_AGE
+    with os.scandir(DOCUMENTATION_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith('.xlsm'):
+                entries.append(entry)
+            elif entry.name.endswith('.tmp'):
+                # A temp file can be renamed into place by another worker at any moment
+                try:
+                    if entry.stat().st_mtime < stale_before:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+    if len(entries) <= max_files:
+        return
+
+    # Workbooks can vanish under a concurrent prune, so stat them up front and skip the gone ones
+    by_mtime = []
+    for entry in entries:
+        try:
+            by_mtime.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            pass
+    by_mtime.sort(reverse=True)
+    for _, path in by_mtime[max_files:]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass  # Already pruned by a concurrent request
+
+def get_documentation(sample, template_file=DOCUMENTATION_TEMPLATE_FILE):
+    """
+    Return the path of the documentation workbook for sample's opportunity,
+    building it from the template only if an identical workbook isn't already
+    cached. Raises FileNotFoundError if the template is missing.
+
+    The cells match what update_documentation_excels writes into the
+    SharePoint copy of the same template: B1-B4 hold the opportunity's
+    customer, RSM, number and description, and A8 down lists every sample of
+    the opportunity with its received date in column B.
+    """
+    template_signature = _file_signature(template_file)
+
+    # Header values come from the Opportunity, as in the SharePoint sync; the
+    # sample's own fields stand in if the Opportunity row is missing
+    opportunity_number = sample.opportunity_number
+    opportunity = Opportunity.objects.filter(
+        opportunity_number=opportunity_number
+    ).only('customer', 'rsm', 'description').first() or sample
+    header = (
+        opportunity.customer or '',
+        opportunity.rsm or '',
+        opportunity_number,
+        opportunity.description or '',
+    )
+
+    # Every sample of the opportunity, listed from A8 down. The rows are part of
+    # the cache key so they're all needed up front; iterator() streams them into
+    # the tuple without the queryset's result cache holding a second copy
+    rows = tuple(Sample.objects.filter(
+        opportunity_number=opportunity_number
+    ).order_by('unique_id').values_list('unique_id', 'date_received').iterator(chunk_size=1000))
+
+    # Identical requests produce identical workbooks, so reuse one built earlier
+    cache_path = documentation_cache_path(header, rows, template_signature)
+    try:
+        os.utime(cache_path)  # Mark as recently used for pruning
+        return cache_path
+    except FileNotFoundError:
+        pass  # Not built yet, or just pruned; build it below
+
+    # openpyxl edits the workbook XML directly (no Excel process);
+    # keep_vba carries the template's macros over to the .xlsm
+    wb = load_workbook(open_documentation_template(template_file), keep_vba=True)
+    ws = wb.active
+    # ws.cell() takes row/column directly instead of parsing an 'A8'-style coordinate;
+    # bound to a local since it's called once per cell
+    cell = ws.cell
+
+    # Header block: B1-B4 are one contiguous run down column B
+    for row, value in enumerate(header, start=1):
+        cell(row=row, column=2, value=value)
+
+    start_row = 8
+    for row, (uid, date_received) in enumerate(rows, start=start_row):
+        cell(row=row, column=1, value=uid)
+        cell(row=row, column=2, value=date_received.strftime('%Y-%m-%d'))
+
+    store_documentation(wb, cache_path)
+
+    # Pruning is housekeeping; the workbook is stored, so don't let it fail the export
+    try:
+        prune_documentation_cache()
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Error pruning documentation cache: {e}")
+    return cache_path
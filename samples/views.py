@@ -1,8 +1,12 @@
 import logging
 import json
-import csv
+import functools
 import subprocess
+import threading
+from collections import defaultdict
+from operator import attrgetter
 from celery import chain
+from celery.result import AsyncResult
 from .tasks import (
     send_sample_received_email,
     update_documentation_excels,
@@ -11,40 +15,85 @@ from .tasks import (
 )
 from datetime import datetime
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, FileResponse
 from django.urls import reverse
 from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
-from django.core.files.base import ContentFile
+from django.utils.encoding import filepath_to_uri
+from django.db import transaction
 import os
-from .models import Sample, SampleImage, Opportunity
-from .utils import create_documentation_on_sharepoint
+from .models import Sample, SampleImage, Opportunity, generate_unique_ids, sync_opportunity_after_delete
+from .utils import create_documentation_on_sharepoint, get_excel_lookups, get_opportunity_links
+from .utils import DOCUMENTATION_CACHE_DIR
 from .tasks import (
     send_sample_received_email,
     update_documentation_excels,
     create_sharepoint_folder_task,
     create_documentation_on_sharepoint_task,
-    save_full_size_image
+    make_thumbnail,
+    save_full_size_image,
+    generate_documentation_task
 )
-import pandas as pd
-import xlwings as xw
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST, require_safe
 from django.views.decorators.csrf import csrf_exempt
-import base64
-from PIL import Image
 import tempfile
-from django.http import HttpResponse, Http404
+from django.http import Http404
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 from reportlab.platypus import Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-from io import BytesIO
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfbase.pdfmetrics import stringWidth
 import qrcode
 from .CreateOppFolderSharepoint import create_sharepoint_folder
 
 # Configure logging
 logger = logging.getLogger('samples')
 
+# Fields serialized for each created sample, fetched in one attrgetter call per row
+_SAMPLE_PAYLOAD_FIELDS = attrgetter(
+    'unique_id', 'date_received', 'customer', 'rsm',
+    'opportunity_number', 'description', 'storage_location'
+)
+
+def samples_to_payload(samples):
+    # Build the JSON-ready rows returned to the sample table after creation;
+    # date.isoformat() gives the same YYYY-MM-DD as strftime without parsing a format
+    return [
+        {
+            'unique_id': unique_id,
+            'date_received': date_received.isoformat(),
+            'customer': customer,
+            'rsm': rsm,
+            'opportunity_number': opportunity_number,
+            'description': description,
+            'location': storage_location
+        }
+        for unique_id, date_received, customer, rsm, opportunity_number, description, storage_location
+        in map(_SAMPLE_PAYLOAD_FIELDS, samples)
+    ]
+
+# Upper bound on how many sample IDs one bulk request may carry
+MAX_ID_BATCH = 10_000
+
+def _parse_id(value):
+    # Only whole numbers or strings of ASCII digits count as IDs; bools (an int
+    # subclass), floats, nulls and nested values are rejected rather than coerced
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    raise ValueError(f"invalid sample id: {value!r}")
+
+def parse_id_list(raw):
+    # Parse a JSON array of sample IDs into a tuple of ints, raising ValueError
+    # (JSONDecodeError is one) for anything else or for more than MAX_ID_BATCH IDs
+    ids = json.loads(raw)
+    if not isinstance(ids, list):
+        raise ValueError("ids must be a JSON array")
+    if len(ids) > MAX_ID_BATCH:
+        raise ValueError(f"at most {MAX_ID_BATCH} ids may be sent at once")
+    return tuple(_parse_id(x) for x in ids)
+
 def create_sample(request):
     logger.debug("Entered create_sample view")
 
@@ -121,26 +170,30 @@ def create_sample(request):
             created_samples = []
 
             if quantity > 0:
-                for i in range(quantity):
-                    sample = Sample.objects.create(
-                        date_received=date_received,
-                        customer=customer,
-                        rsm=rsm_full_name,
-                        opportunity_number=opportunity_number,
-                        description=description,
-                        storage_location=location,
-                        quantity=1  # Each entry represents a single unit
-                    )
-                    created_samples.append(sample)
-                logger.debug(f"Created samples: {created_samples}")
-
-                # Update sample_ids field for the Opportunity
-                sample_ids = Sample.objects.filter(
-                    opportunity_number=opportunity_number
-                ).values_list('unique_id', flat=True)
-                opportunity.sample_ids = ','.join(map(str, sample_ids))
-                opportunity.update = True
-                opportunity.save()
+                # Insert the whole batch with a single multi-row INSERT
+                with transaction.atomic():
+                    created_samples = Sample.objects.bulk_create([
+                        Sample(
+                            unique_id=unique_id,
+                            date_received=date_received,
+                            customer=customer,
+                            rsm=rsm_full_name,
+                            opportunity_number=opportunity_number,
+                            description=description,
+                            storage_location=location,
+                            quantity=1  # Each entry represents a single unit
+                        )
+                        for unique_id in generate_unique_ids(quantity)
+                    ])
+                    logger.debug(f"Created samples: {created_samples}")
+
+                    # Update sample_ids field for the Opportunity
+                    sample_ids = Sample.objects.filter(
+                        opportunity_number=opportunity_number
+                    ).values_list('unique_id', flat=True)
+                    opportunity.sample_ids = ','.join(map(str, sample_ids))
+                    opportunity.update = True
+                    opportunity.save()
             else:
                 logger.debug("Quantity is zero; no samples created.")
                 # Clear sample_ids for the Opportunity
@@ -176,17 +229,7 @@ def create_sample(request):
 
             return JsonResponse({
                 'status': 'success',
-                'created_samples': [
-                    {
-                        'unique_id': sample.unique_id,
-                        'date_received': sample.date_received.strftime('%Y-%m-%d'),
-                        'customer': sample.customer,
-                        'rsm': sample.rsm,
-                        'opportunity_number': sample.opportunity_number,
-                        'description': sample.description,
-                        'location': sample.storage_location
-                    } for sample in created_samples
-                ]
+                'created_samples': samples_to_payload(created_samples)
             })
 
         except Exception as e:
@@ -199,19 +242,20 @@ def create_sample(request):
         # Call the Celery task
         update_documentation_excels.delay()
 
-        # Retrieve all opportunity numbers from the Opportunity model
-        opportunity_numbers = Opportunity.objects.values_list('opportunity_number', flat=True)
-
-        # Update sample_ids field in the Opportunity table
-        for opportunity in Opportunity.objects.all():
-            # Retrieve all unique IDs associated with this opportunity
-            sample_ids = Sample.objects.filter(
-                opportunity_number=opportunity.opportunity_number
-            ).values_list('unique_id', flat=True)
-
-            # Update the sample_ids field
-            opportunity.sample_ids = ','.join(map(str, sample_ids))
-            opportunity.save()
+        # Group every sample's unique ID by opportunity in a single query
+        sample_ids_by_opportunity = defaultdict(list)
+        for opportunity_number, unique_id in Sample.objects.order_by('id').values_list('opportunity_number', 'unique_id'):
+            sample_ids_by_opportunity[opportunity_number].append(str(unique_id))
+
+        # Update sample_ids field in the Opportunity table, writing only the rows that drifted
+        stale_opportunities = []
+        for opportunity in Opportunity.objects.only('id', 'opportunity_number', 'sample_ids'):
+            sample_ids = ','.join(sample_ids_by_opportunity.get(opportunity.opportunity_number, []))
+            if opportunity.sample_ids != sample_ids:
+                opportunity.sample_ids = sample_ids
+                stale_opportunities.append(opportunity)
+        if stale_opportunities:
+            Opportunity.objects.bulk_update(stale_opportunities, ['sample_ids'])
 
         # Path to the DocumentationTemplate.xlsm file
         template_file = os.path.join(settings.BASE_DIR, 'OneDrive_Sync', '_Templates', 'DocumentationTemplate.xlsm')
@@ -220,44 +264,28 @@ def create_sample(request):
 
         # Define excel_file before the loop
         excel_file = os.path.join(settings.BASE_DIR, 'Apps_Database.xlsx')
-        if not os.path.exists(excel_file):
+
+        # Unique customers/RSMs and the JSON-encoded rows, cached until the workbook changes.
+        # The mtime lookup doubles as the existence check, so the file is stat'ed only once.
+        try:
+            unique_customers, unique_rsms, excel_data = get_excel_lookups(excel_file)
+        except FileNotFoundError:
             logger.error(f"Excel file not found at {excel_file}")
             return JsonResponse({'status': 'error', 'error': 'Excel file not found'}, status=500)
 
-
-        # Now excel_file is defined, so you can read it
-        df = pd.read_excel(excel_file)
-
-        # Get unique customers and RSMs
-        unique_customers = sorted(df['Customer'].dropna().unique())
-        unique_rsms = sorted(df['RSM'].dropna().unique())
-
-        # Convert DataFrame to JSON serializable format
-        excel_data = df.to_dict(orient='records')
-
-        # Load saved samples
-        samples = list(Sample.objects.all().values())
-
-        # Convert date_received to string format for JSON serialization
-        for sample in samples:
-            if isinstance(sample['date_received'], datetime):
-                sample['date_received'] = sample['date_received'].strftime('%Y-%m-%d')
+        # Load saved samples, only the fields the table renders; DjangoJSONEncoder
+        # writes date_received as YYYY-MM-DD
+        samples = list(Sample.objects.values(
+            'unique_id', 'date_received', 'customer', 'rsm',
+            'opportunity_number', 'description', 'storage_location'
+        ))
 
         logger.debug(f"Samples List: {samples}")
 
         # Read Hyperlinks.csv
         try:
             hyperlinks_csv_file = os.path.join(settings.BASE_DIR, 'Hyperlinks.csv')
-            opportunity_links = {}
-
-            with open(hyperlinks_csv_file, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                next(reader, None)  # Skip header row if present
-                for row in reader:
-                    if len(row) >= 2:
-                        opportunity_number = row[0].strip()
-                        web_address = row[1].strip()
-                        opportunity_links[opportunity_number] = web_address
+            opportunity_links = get_opportunity_links(hyperlinks_csv_file)
         except Exception as e:
             logger.error(f"Error reading Hyperlinks.csv: {e}")
             opportunity_links = {}
@@ -265,7 +293,7 @@ def create_sample(request):
         return render(request, 'samples/create_sample.html', {
             'unique_customers': unique_customers,
             'unique_rsms': unique_rsms,
-            'excel_data': json.dumps(excel_data, cls=DjangoJSONEncoder),
+            'excel_data': excel_data,
             'samples': json.dumps(samples, cls=DjangoJSONEncoder),
             'opportunity_links': json.dumps(opportunity_links, cls=DjangoJSONEncoder),
         })
@@ -286,7 +314,6 @@ def upload_files(request):
             logger.error("Sample not found with ID: %s", sample_id)
             return JsonResponse({'status': 'error', 'error': 'Sample not found'})
 
-        image_urls = []
         image_ids = []  # Initialize the list to collect image IDs
 
         try:
@@ -302,50 +329,34 @@ def upload_files(request):
                     logger.error("Invalid file type: %s", file.content_type)
                     return JsonResponse({'status': 'error', 'error': 'Invalid file type. Only images are allowed.'})
 
-                # Open the uploaded image
-                image = Image.open(file)
-                image = image.convert('RGB')  # Ensure image is in RGB mode
-
-                # Create a thumbnail
-                max_size = (200, 200)  # Set the desired thumbnail size
-                image.thumbnail(max_size, resample=Image.LANCZOS)
-
-                # Save the thumbnail to an in-memory file
-                thumb_io = BytesIO()
-                image.save(thumb_io, format='JPEG', quality=85)
-                thumb_io.seek(0)  # Reset file pointer to the beginning
-
-                # Create a ContentFile from the in-memory file
-                image_content = ContentFile(thumb_io.read())
+                # Save the uploaded file to a temporary file for the worker tasks
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
+                    for chunk in file.chunks():
+                        temp_file.write(chunk)
+                    temp_file_path = temp_file.name
 
                 # Generate the filename with ID and index number in parentheses
                 filename = f"{sample.unique_id}({image_count}).jpg"
 
-                # Save the thumbnail image to the model
-                sample_image = SampleImage(sample=sample)
-                sample_image.image.save(filename, image_content)
-                sample_image.save()
-
-                # Collect the URL and ID to return to the client
-                image_urls.append(sample_image.image.url)
+                # Create the record now so its ID can be returned; the thumbnail is
+                # filled in by the worker
+                sample_image = SampleImage.objects.create(sample=sample)
                 image_ids.append(sample_image.id)  # Collect the image ID
 
-                # Save the uploaded file to a temporary file
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                    for chunk in file.chunks():
-                        temp_file.write(chunk)
-                    temp_file_path = temp_file.name
-
                 # Log the task invocation
                 logger.info(
-                    "Enqueuing save_full_size_image task for SampleImage ID %s with temp_file_path %s",
+                    "Enqueuing make_thumbnail and save_full_size_image tasks for SampleImage ID %s with temp_file_path %s",
                     sample_image.id,
                     temp_file_path
                 )
 
-                # Enqueue Celery task with the path to the temporary file
-                save_full_size_image.delay(sample_image.id, temp_file_path)
-                logger.debug("Task enqueued successfully for SampleImage ID %s", sample_image.id)
+                # Thumbnail first: save_full_size_image reuses its filename and
+                # deletes the temporary file when done
+                chain(
+                    make_thumbnail.si(sample_image.id, temp_file_path, filename),
+                    save_full_size_image.si(sample_image.id, temp_file_path)
+                ).delay()
+                logger.debug("Tasks enqueued successfully for SampleImage ID %s", sample_image.id)
 
         except Exception as e:
             logger.exception("Error processing files: %s", e)
@@ -355,7 +366,6 @@ def upload_files(request):
         return JsonResponse({
             'status': 'success',
             'message': 'Files uploaded successfully.',
-            'images': image_urls,
             'image_ids': image_ids  # Include image IDs in the response
         })
 
@@ -370,16 +380,15 @@ def update_sample_location(request):
 
             if 'ids' in request.POST:
                 # Updating multiple samples
-                ids = json.loads(request.POST.get('ids', '[]'))
-                samples = Sample.objects.filter(unique_id__in=ids)
-
-                for sample in samples:
-                    if location == "remove":
-                        sample.storage_location = None
-                    else:
-                        sample.storage_location = location
-                    sample.audit = audit
-                    sample.save()
+                ids = parse_id_list(request.POST.get('ids', '[]'))
+                new_location = None if location == "remove" else location
+
+                # Single UPDATE for all selected rows; location/audit aren't part of
+                # the Opportunity bookkeeping done in Sample.save()
+                Sample.objects.filter(unique_id__in=ids).update(
+                    storage_location=new_location,
+                    audit=audit
+                )
 
                 return JsonResponse({'status': 'success', 'message': 'Locations updated successfully for selected samples'})
             else:
@@ -413,21 +422,31 @@ def update_sample_location(request):
 def delete_samples(request):
     if request.method == 'POST':
         try:
-            ids = json.loads(request.POST.get('ids', '[]'))
-            ids = json.loads(request.POST.get('ids', '[]'))
+            ids = parse_id_list(request.POST.get('ids', '[]'))
 
             # Retrieve the samples to be deleted
             samples_to_delete = Sample.objects.filter(unique_id__in=ids)
 
-            for sample in samples_to_delete:
-                sample.delete()  # Calls the delete method on each instance
+            # The queryset delete below skips Sample.delete(), so capture the
+            # opportunities whose bookkeeping it would have synced afterwards
+            opportunity_numbers = list(
+                samples_to_delete.values_list('opportunity_number', flat=True).distinct()
+            )
+
+            with transaction.atomic():
+                # One DELETE per table; SampleImage rows go via the FK cascade, which
+                # (as with Sample.delete()) leaves their image files in place
+                samples_to_delete.delete()
+
+            for opportunity_number in opportunity_numbers:
+                sync_opportunity_after_delete(opportunity_number)
 
             logger.debug(f"Deleted samples with IDs: {ids}")
 
             return JsonResponse({'status': 'success'})
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON data: {e}")
-            return JsonResponse({'status': 'error', 'error': 'Invalid JSON data'}, status=400)
+        except ValueError as e:
+            logger.error(f"Invalid ID list: {e}")
+            return JsonResponse({'status': 'error', 'error': 'Invalid ID list'}, status=400)
         except Exception as e:
             logger.error(f"Error deleting samples: {e}")
             return JsonResponse({'status': 'error', 'error': str(e)}, status=500)
@@ -435,118 +454,125 @@ def delete_samples(request):
     logger.error("Invalid request method for delete_samples")
     return JsonResponse({'status': 'error', 'error': 'Invalid request method'}, status=405)
 
-def generate_qr_code(data):
-    # Create a QR code instance
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    # Add data to the QR code
-    qr.add_data(data)
-    qr.make(fit=True)
+# A single QR code builder reused for every code; QRCode isn't thread-safe,
+# so it is only touched while holding _QR_LOCK
+_QR = qrcode.QRCode(
+    version=1,
+    error_correction=qrcode.constants.ERROR_CORRECT_L,
+    box_size=10,
+    border=4,
+)
+_QR_LOCK = threading.Lock()
+
+def make_qr_image(data, border=4):
+    """Return the QR code for data as a plain PIL image."""
+    with _QR_LOCK:
+        # Reset the shared instance; clear() keeps the previously fitted version
+        _QR.clear()
+        _QR.version = 1
+        _QR.border = border
+
+        # Add data to the QR code
+        _QR.add_data(data)
+        _QR.make(fit=True)
+
+        # Create an image from the QR code instance
+        img = _QR.make_image(fill_color="black", back_color="white")
 
-    # Create an image from the QR code instance
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
+    # qrcode wraps the PIL image; unwrap it so callers get the real thing
+    return img.get_image() if hasattr(img, 'get_image') else img
 
-    # Encode the image to base64 string
-    img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
-    return img_str
+@functools.lru_cache(maxsize=256)
+def get_label_qr_image(url):
+    # reportlab reads PIL images directly, so labels skip the PNG encode and
+    # the decode ImageReader would do on it. Labels use a 1-module border.
+    return make_qr_image(url, border=1)
 
 def mm_to_points(mm_value):
     return mm_value * (72 / 25.4)
 
-def generate_label(output_path, qr_data, id_value, date_received, rsm_value, description):
-    label_width = mm_to_points(101.6)
-    label_height = mm_to_points(50.8)
-    c = canvas.Canvas(output_path, pagesize=(label_width, label_height))
-
-    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=1)
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-
-    img = qr.make_image(fill='black', back_color='white')
-    img_buffer = BytesIO()
-    img.save(img_buffer, format='PNG')
-    img_buffer.seek(0)
-    img_reader = ImageReader(img_buffer)
-
-    margin = mm_to_points(5)
-    qr_x = label_width / 2 + margin
-    qr_y = margin
-    qr_width = label_width / 2 - 2 * margin
-    qr_height = label_height - 2 * margin
-
-    c.drawImage(img_reader, qr_x, qr_y, qr_width, qr_height)
-
-    font_bold = "Helvetica-Bold"
-    font_regular = "Helvetica"
-    font_size = mm_to_points(4)
-
-    id_text = "ID: "
-    c.setFont(font_bold, font_size)
-    id_text_width = c.stringWidth(id_text)
-    c.setFont(font_regular, font_size)
-    id_value_width = c.stringWidth(id_value)
-    total_id_text_width = id_text_width + id_value_width
-
-    right_shift_offset = mm_to_points(2)
-    left_half_width = (label_width / 2) - (2 * margin)
-    start_x_id = margin + (left_half_width - total_id_text_width) / 2 + right_shift_offset
-
-    c.setFont(font_bold, font_size)
-    c.drawString(start_x_id, label_height - margin - mm_to_points(2), id_text)
-    c.setFont(font_regular, font_size)
-    c.drawString(start_x_id + id_text_width, label_height - margin - mm_to_points(2), id_value)
-
-    date_text = "Date Received: "
-    c.setFont(font_bold, font_size)
-    date_text_width = c.stringWidth(date_text)
-    c.setFont(font_regular, font_size)
-    date_value_width = c.stringWidth(date_received)
-    total_date_text_width = date_text_width + date_value_width
-
-    start_x_date = margin + (left_half_width - total_date_text_width) / 3 + right_shift_offset
-
-    c.setFont(font_bold, font_size)
-    c.drawString(start_x_date, label_height - margin - mm_to_points(8), date_text)
-    c.setFont(font_regular, font_size)
-    c.drawString(start_x_date + date_text_width, label_height - margin - mm_to_points(8), date_received)
-
-    rsm_text = "RSM: "
-    c.setFont(font_bold, font_size)
-    rsm_text_width = c.stringWidth(rsm_text)
-    c.setFont(font_regular, font_size)
-    rsm_value_width = c.stringWidth(rsm_value)
-    total_rsm_text_width = rsm_text_width + rsm_value_width
-
-    start_x_rsm = margin + (left_half_width - total_rsm_text_width) / 2 + right_shift_offset
-
-    c.setFont(font_bold, font_size)
-    c.drawString(start_x_rsm, label_height - margin - mm_to_points(14), rsm_text)
-    c.setFont(font_regular, font_size)
-    c.drawString(start_x_rsm + rsm_text_width, label_height - margin - mm_to_points(14), rsm_value)
-
-    styles = getSampleStyleSheet()
-    normal_style = styles['Normal']
-    normal_style.fontName = font_regular
-    normal_style.fontSize = font_size
-    normal_style.leading = font_size * 1.2
-    normal_style.alignment = 1
-
-    wrapped_paragraph = Paragraph(description, normal_style)
-    max_text_width = label_width / 2 - 2 * margin
-    text_x = margin
-    text_y = margin + mm_to_points(5)
-
-    c.translate(text_x, text_y)
-    wrapped_paragraph.wrapOn(c, max_text_width, label_height)
+# Label layout, computed once rather than for every label printed
+LABEL_WIDTH = mm_to_points(101.6)
+LABEL_HEIGHT = mm_to_points(50.8)
+LABEL_MARGIN = mm_to_points(5)
+LABEL_FONT_BOLD = "Helvetica-Bold"
+LABEL_FONT_REGULAR = "Helvetica"
+LABEL_FONT_SIZE = mm_to_points(4)
+LABEL_RIGHT_SHIFT = mm_to_points(2)
+LABEL_LEFT_HALF_WIDTH = (LABEL_WIDTH / 2) - (2 * LABEL_MARGIN)
+
+LABEL_QR_X = LABEL_WIDTH / 2 + LABEL_MARGIN
+LABEL_QR_Y = LABEL_MARGIN
+LABEL_QR_WIDTH = LABEL_WIDTH / 2 - 2 * LABEL_MARGIN
+LABEL_QR_HEIGHT = LABEL_HEIGHT - 2 * LABEL_MARGIN
+
+# Baselines of the ID / Date Received / RSM lines
+LABEL_ID_Y = LABEL_HEIGHT - LABEL_MARGIN - mm_to_points(2)
+LABEL_DATE_Y = LABEL_HEIGHT - LABEL_MARGIN - mm_to_points(8)
+LABEL_RSM_Y = LABEL_HEIGHT - LABEL_MARGIN - mm_to_points(14)
+
+# The bold captions never change, so neither do their widths
+LABEL_ID_TEXT = "ID: "
+LABEL_DATE_TEXT = "Date Received: "
+LABEL_RSM_TEXT = "RSM: "
+LABEL_ID_TEXT_WIDTH = stringWidth(LABEL_ID_TEXT, LABEL_FONT_BOLD, LABEL_FONT_SIZE)
+LABEL_DATE_TEXT_WIDTH = stringWidth(LABEL_DATE_TEXT, LABEL_FONT_BOLD, LABEL_FONT_SIZE)
+LABEL_RSM_TEXT_WIDTH = stringWidth(LABEL_RSM_TEXT, LABEL_FONT_BOLD, LABEL_FONT_SIZE)
+
+LABEL_DESCRIPTION_STYLE = ParagraphStyle(
+    'LabelDescription',
+    parent=getSampleStyleSheet()['Normal'],
+    fontName=LABEL_FONT_REGULAR,
+    fontSize=LABEL_FONT_SIZE,
+    leading=LABEL_FONT_SIZE * 1.2,
+    alignment=1
+)
+LABEL_DESCRIPTION_X = LABEL_MARGIN
+LABEL_DESCRIPTION_Y = LABEL_MARGIN + mm_to_points(5)
+LABEL_DESCRIPTION_WIDTH = LABEL_WIDTH / 2 - 2 * LABEL_MARGIN
+
+def generate_label(c, img_reader, id_value, date_received, rsm_value, description):
+    # Draws one label as its own page on canvas c, with the pre-built QR code
+    # image in img_reader
+    c.saveState()
+
+    c.drawImage(img_reader, LABEL_QR_X, LABEL_QR_Y, LABEL_QR_WIDTH, LABEL_QR_HEIGHT)
+
+    id_value_width = stringWidth(id_value, LABEL_FONT_REGULAR, LABEL_FONT_SIZE)
+    total_id_text_width = LABEL_ID_TEXT_WIDTH + id_value_width
+    start_x_id = LABEL_MARGIN + (LABEL_LEFT_HALF_WIDTH - total_id_text_width) / 2 + LABEL_RIGHT_SHIFT
+
+    c.setFont(LABEL_FONT_BOLD, LABEL_FONT_SIZE)
+    c.drawString(start_x_id, LABEL_ID_Y, LABEL_ID_TEXT)
+    c.setFont(LABEL_FONT_REGULAR, LABEL_FONT_SIZE)
+    c.drawString(start_x_id + LABEL_ID_TEXT_WIDTH, LABEL_ID_Y, id_value)
+
+    date_value_width = stringWidth(date_received, LABEL_FONT_REGULAR, LABEL_FONT_SIZE)
+    total_date_text_width = LABEL_DATE_TEXT_WIDTH + date_value_width
+    start_x_date = LABEL_MARGIN + (LABEL_LEFT_HALF_WIDTH - total_date_text_width) / 3 + LABEL_RIGHT_SHIFT
+
+    c.setFont(LABEL_FONT_BOLD, LABEL_FONT_SIZE)
+    c.drawString(start_x_date, LABEL_DATE_Y, LABEL_DATE_TEXT)
+    c.setFont(LABEL_FONT_REGULAR, LABEL_FONT_SIZE)
+    c.drawString(start_x_date + LABEL_DATE_TEXT_WIDTH, LABEL_DATE_Y, date_received)
+
+    rsm_value_width = stringWidth(rsm_value, LABEL_FONT_REGULAR, LABEL_FONT_SIZE)
+    total_rsm_text_width = LABEL_RSM_TEXT_WIDTH + rsm_value_width
+    start_x_rsm = LABEL_MARGIN + (LABEL_LEFT_HALF_WIDTH - total_rsm_text_width) / 2 + LABEL_RIGHT_SHIFT
+
+    c.setFont(LABEL_FONT_BOLD, LABEL_FONT_SIZE)
+    c.drawString(start_x_rsm, LABEL_RSM_Y, LABEL_RSM_TEXT)
+    c.setFont(LABEL_FONT_REGULAR, LABEL_FONT_SIZE)
+    c.drawString(start_x_rsm + LABEL_RSM_TEXT_WIDTH, LABEL_RSM_Y, rsm_value)
+
+    wrapped_paragraph = Paragraph(description, LABEL_DESCRIPTION_STYLE)
+
+    c.translate(LABEL_DESCRIPTION_X, LABEL_DESCRIPTION_Y)
+    wrapped_paragraph.wrapOn(c, LABEL_DESCRIPTION_WIDTH, LABEL_HEIGHT)
     wrapped_paragraph.drawOn(c, 0, 0)
 
-    c.save()
+    c.restoreState()
+    c.showPage()
 
 def handle_print_request(request):
     if request.method == 'POST':
@@ -556,53 +582,69 @@ def handle_print_request(request):
             if not ids_to_print:
                 return JsonResponse({'status': 'error', 'error': 'No sample IDs provided'}, status=400)
 
+            # Fetch every requested sample in one query
+            samples_by_id = {
+                str(sample.unique_id): sample
+                for sample in Sample.objects.filter(unique_id__in=ids_to_print)
+            }
+            for sample_id in ids_to_print:
+                if str(sample_id) not in samples_by_id:
+                    logger.error(f"Sample with ID {sample_id} does not exist")
+                    return JsonResponse({'status': 'error', 'error': f'Sample with ID {sample_id} does not exist'}, status=404)
+
             # Use the first sample_id to determine the labels directory
-            sample = Sample.objects.get(unique_id=ids_to_print[0])
-            labels_dir = os.path.join(settings.BASE_DIR, 'OneDrive_Sync', sample.opportunity_number, 'Samples', 'Labels')
+            labels_dir = os.path.join(
+                settings.BASE_DIR, 'OneDrive_Sync', samples_by_id[str(ids_to_print[0])].opportunity_number,
+                'Samples', 'Labels'
+            )
             os.makedirs(labels_dir, exist_ok=True)
 
-            if not ids_to_print:
-                return JsonResponse({'status': 'error', 'error': 'No sample IDs provided'}, status=400)
+            # Resolve the manage_sample URL once; only the trailing ID differs per label
+            qr_url_prefix = request.build_absolute_uri(reverse('manage_sample', args=[0]))[:-len('0/')]
 
-            for sample_id in ids_to_print:
-                try:
-                    sample = Sample.objects.get(unique_id=sample_id)
-                except Sample.DoesNotExist:
-                    logger.error(f"Sample with ID {sample_id} does not exist")
-                    return JsonResponse({'status': 'error', 'error': f'Sample with ID {sample_id} does not exist'}, status=404)
-                except Exception as e:
-                    logger.error(f"Error retrieving sample: {e}")
-                    return JsonResponse({'status': 'error', 'error': 'Error retrieving sample'}, status=500)
+            # All labels go into one multi-page PDF so the printer is spooled once. It's
+            # rendered to a private temp file and removed once lpr has spooled its own
+            # copy; each label is also kept as label_<id>.pdf in the Labels folder
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as pdf_file:
+                output_path = pdf_file.name
+            try:
+                c = canvas.Canvas(output_path, pagesize=(LABEL_WIDTH, LABEL_HEIGHT))
 
-                try:
-                    qr_url = request.build_absolute_uri(reverse('manage_sample', args=[sample.unique_id]))
-                    qr_code = generate_qr_code(qr_url)
-                except Exception as e:
-                    logger.error(f"Error generating QR code: {e}")
-                    return JsonResponse({'status': 'error', 'error': 'Failed to generate QR code'}, status=500)
+                for sample_id in ids_to_print:
+                    sample = samples_by_id[str(sample_id)]
+
+                    try:
+                        qr_url = f"{qr_url_prefix}{sample.unique_id}/"
+                        img_reader = ImageReader(get_label_qr_image(qr_url))
+                    except Exception as e:
+                        logger.error(f"Error generating QR code: {e}")
+                        return JsonResponse({'status': 'error', 'error': 'Failed to generate QR code'}, status=500)
 
-                qr_url = request.build_absolute_uri(reverse('manage_sample', args=[sample.unique_id]))
-                qr_code_img = qrcode.make(qr_url)
-                qr_code_buffer = BytesIO()
-                qr_code_img.save(qr_code_buffer, format='PNG')
-                qr_code_buffer.seek(0)
+                    id_value = str(sample.unique_id)
+                    date_received = sample.date_received.strftime('%Y-%m-%d')
+                    rsm_value = sample.rsm
+                    description = sample.description
 
-                output_path = os.path.join(labels_dir, f"label_{sample.unique_id}.pdf")
+                    label = (img_reader, id_value, date_received, rsm_value, description)
+                    generate_label(c, *label)
 
-                qr_data = qr_url
-                id_value = str(sample.unique_id)
-                date_received = sample.date_received.strftime('%Y-%m-%d')
-                rsm_value = sample.rsm
-                description = sample.description
+                    label_canvas = canvas.Canvas(
+                        os.path.join(labels_dir, f"label_{id_value}.pdf"),
+                        pagesize=(LABEL_WIDTH, LABEL_HEIGHT)
+                    )
+                    generate_label(label_canvas, *label)
+                    label_canvas.save()
 
-                generate_label(output_path, qr_data, id_value, date_received, rsm_value, description)
+                c.save()
 
-                # Send the label PDF to the default printer
+                # Send the combined label PDF to the default printer
                 try:
                     subprocess.run(['lpr', output_path], check=True)
                 except subprocess.CalledProcessError as e:
-                    logger.error(f"Error printing label for sample {sample_id}: {e}")
-                    return JsonResponse({'status': 'error', 'error': f'Failed to print label for sample {sample_id}'}, status=500)
+                    logger.error(f"Error printing labels for samples {ids_to_print}: {e}")
+                    return JsonResponse({'status': 'error', 'error': 'Failed to print labels'}, status=500)
+            finally:
+                os.remove(output_path)
 
             return JsonResponse({'status': 'success'})
         except json.JSONDecodeError:
@@ -614,8 +656,6 @@ def handle_print_request(request):
         return JsonResponse({'status': 'error', 'error': 'Invalid request method'}, status=405)
 
 def manage_sample(request, sample_id):
-    # Retrieve the sample or return a 404 error if not found
-    sample = get_object_or_404(Sample, unique_id=sample_id)
     logger.debug(f"Accessing manage_sample for sample_id: {sample_id}")
 
     if request.method == 'POST':
@@ -624,44 +664,99 @@ def manage_sample(request, sample_id):
             location = request.POST.get('location')
             audit = request.POST.get('audit') == 'true'  # Check if the toggle is active
 
-            # Update sample fields
+            # Update sample fields with a single UPDATE; the row doesn't need to be loaded first
+            changes = {'audit': audit}
             if location:
                 if location == "remove":
-                    sample.storage_location = None
+                    changes['storage_location'] = None
                 else:
-                    sample.storage_location = location
+                    changes['storage_location'] = location
 
-            sample.audit = audit
-            sample.save()
-            logger.debug(f"Updated sample {sample_id}: location={sample.storage_location}, audit={sample.audit}")
-
-            # Redirect back to the same page after POST to prevent resubmission
-            return redirect('manage_sample', sample_id=sample.unique_id)
+            updated = Sample.objects.filter(unique_id=sample_id).update(**changes)
         except Exception as e:
             logger.error(f"Error updating sample {sample_id}: {e}")
             return JsonResponse({'status': 'error', 'error': str(e)}, status=500)
 
-    # For GET requests, render the template with the sample data
+        if not updated:
+            raise Http404(f"Sample {sample_id} not found")
+        logger.debug(f"Updated sample {sample_id}: {changes}")
+
+        # Redirect back to the same page after POST to prevent resubmission
+        return redirect('manage_sample', sample_id=sample_id)
+
+    # For GET requests, render the template with only the fields it displays
+    sample = get_object_or_404(
+        Sample.objects.only(
+            'unique_id', 'date_received', 'customer', 'rsm',
+            'opportunity_number', 'description', 'storage_location', 'audit'
+        ),
+        unique_id=sample_id
+    )
     return render(request, 'samples/manage_sample.html', {'sample': sample})
 
+@require_POST
+def start_documentation_export(request, sample_id):
+    # Workbooks are built by a Celery worker so no web worker is held up on openpyxl;
+    # the browser polls download_url until the file is ready
+    if not Sample.objects.filter(unique_id=sample_id).exists():
+        raise Http404(f"Sample {sample_id} not found")
+    task = generate_documentation_task.delay(sample_id)
+    return JsonResponse({
+        'status': 'success',
+        'task_id': task.id,
+        'download_url': reverse('download_documentation_export', args=[task.id]),
+    }, status=202)
+
+@require_safe
+def download_documentation_export(request, task_id):
+    result = AsyncResult(task_id)
+    if not result.ready():
+        return JsonResponse({'status': 'pending'}, status=202)
+    if not result.successful():
+        logger.error(f"Documentation export {task_id} failed: {result.result}")
+        return JsonResponse({'status': 'error', 'error': 'Failed to generate documentation'}, status=500)
+
+    export = result.result
+    cache_path = os.path.join(DOCUMENTATION_CACHE_DIR, os.path.basename(export['cache_file']))
+    try:
+        # FileResponse streams the file in chunks and closes it when the response is done
+        output_file = open(cache_path, 'rb')
+    except FileNotFoundError:
+        raise Http404("Documentation export has expired")
+
+    return FileResponse(
+        output_file,
+        as_attachment=True,
+        filename=export['filename'],
+        content_type='application/vnd.ms-excel.sheet.macroEnabled.12'
+    )
+
+@require_GET
 def get_sample_images(request):
     sample_id = request.GET.get('sample_id')
-    try:
-        sample = Sample.objects.get(unique_id=sample_id)
-        images = sample.images.all()
-        image_data = [
-            {
-                'id': image.id,
-                'filename': os.path.basename(image.image.name),
-                'url': request.build_absolute_uri(image.image.url),
-                'full_size_url': request.build_absolute_uri(image.full_size_image.url) if image.full_size_image else None
-            }
-            for image in images
-        ]
-        return JsonResponse({'status': 'success', 'images': image_data})
-    except Sample.DoesNotExist:
+    if not Sample.objects.filter(unique_id=sample_id).exists():
         return JsonResponse({'status': 'error', 'error': 'Sample not found'})
 
+    # Every file lives under its storage's base_url, so build URLs by concatenation
+    # instead of going through FieldFile.url/urljoin for each image; filepath_to_uri
+    # percent-encodes the name the same way storage.url() does
+    thumb_base = request.build_absolute_uri(SampleImage._meta.get_field('image').storage.base_url)
+    full_size_base = request.build_absolute_uri(SampleImage._meta.get_field('full_size_image').storage.base_url)
+    # Images still waiting on their thumbnail task are left out until it finishes
+    images = SampleImage.objects.filter(sample__unique_id=sample_id).exclude(image='').values_list(
+        'id', 'image', 'full_size_image'
+    )
+    image_data = [
+        {
+            'id': image_id,
+            'filename': os.path.basename(image_name),
+            'url': thumb_base + filepath_to_uri(image_name),
+            'full_size_url': full_size_base + filepath_to_uri(full_size_name) if full_size_name else None
+        }
+        for image_id, image_name, full_size_name in images
+    ]
+    return JsonResponse({'status': 'success', 'images': image_data})
+
 @csrf_exempt  # Add this if you're not using CSRF tokens properly
 @require_POST
 def delete_sample_image(request):